@@ -1,10 +1,98 @@
 import os
 import json
 import re
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import fitz  # PyMuPDF
 import pdfplumber
-from PyPDF2 import PdfReader
 from collections import Counter
+from itertools import groupby
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:
+    # No-op stand-in so the scoring kernels stay plain Python functions
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        if args and callable(args[0]):
+            return args[0]
+        return wrap
+
+# Precompiled patterns for the per-line hot loops
+_WS = re.compile(r'\s+')
+_NUM1 = re.compile(r'^\d+\.\s+')
+_NUM2 = re.compile(r'^\d+\.\d+\s+')
+_NUM3 = re.compile(r'^\d+\.\d+\.\d+\s+')
+_NUMBRACK = re.compile(r'^\d+[\.\)]\s+')
+_TITLECASE = re.compile(r'^[A-Z][a-z]+(\s+[A-Z][a-z]+)*:?\s*$')
+_ONLYDIGITS = re.compile(r'^\d+$')
+
+@njit(cache=True)
+def _heading_score(font_size, avg_font_size, is_bold,
+                   pat_numbered, pat_titlecase, pat_allcaps,
+                   has_keyword, is_noise):
+    """Numeric half of is_likely_heading (JIT-compiled when numba is present)"""
+    score = 0
+
+    # Font size analysis
+    if font_size > avg_font_size * 1.3:
+        score += 4
+    elif font_size > avg_font_size * 1.1:
+        score += 2
+
+    # Bold text
+    if is_bold:
+        score += 2
+
+    # Text patterns
+    if pat_numbered:
+        score += 3
+    elif pat_titlecase:
+        score += 2
+    elif pat_allcaps:
+        score += 1
+
+    # Keyword matching
+    if has_keyword:
+        score += 1
+
+    # Avoid common non-headings
+    if is_noise:
+        score -= 5
+
+    return score
+
+@njit(cache=True)
+def _level_score(font_size, avg_font_size, num_depth):
+    """Numeric half of classify_heading_level (JIT-compiled when numba is present)"""
+    size_ratio = font_size / avg_font_size if avg_font_size > 0 else 1.0
+
+    # Primary: Font size
+    if size_ratio >= 1.5:
+        level_score = 3
+    elif size_ratio >= 1.2:
+        level_score = 2
+    else:
+        level_score = 1
+
+    # Numbering depth overrides
+    if num_depth == 3:      # "1.1.1 "
+        level_score = 1
+    elif num_depth == 2:    # "1.1 "
+        level_score = min(level_score, 2)
+    elif num_depth == 1:    # "1. "
+        level_score = max(level_score, 3)
+
+    return level_score
 
 class PDFOutlineExtractor:
     def __init__(self):
@@ -17,110 +105,94 @@ class PDFOutlineExtractor:
     def extract_title(self, pdf_path):
         """Extract title using multiple strategies"""
         try:
-            # Strategy 1: PDF metadata
-            with open(pdf_path, 'rb') as file:
-                reader = PdfReader(file)
-                if reader.metadata and reader.metadata.title:
-                    title = reader.metadata.title.strip()
-                    if title and len(title) > 3:
-                        return title
+            with fitz.open(pdf_path) as doc:
+                return self._title_from_doc(doc)
+        except:
+            return ""
+
+    def _title_from_doc(self, doc):
+        """Title strategies against an already-open document"""
+        # Strategy 1: PDF metadata (trailer /Info only - no page parsing)
+        try:
+            title = (doc.metadata or {}).get('title', '').strip()
+            if title and len(title) > 3:
+                return title
         except:
             pass
-        
+
         # Strategy 2: First page analysis
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                first_page = pdf.pages[0]
-                chars = first_page.chars
-                
-                if not chars:
-                    return ""
-                
-                # Find largest font size text on first page
-                font_sizes = [char.get('size', 12) for char in chars if char.get('size')]
-                if font_sizes:
-                    max_font_size = max(font_sizes)
-                    
-                    # Get text with largest font size
-                    title_chars = [char for char in chars 
-                                 if char.get('size', 12) >= max_font_size * 0.9]
-                    
-                    if title_chars:
-                        # Sort by position and extract text
-                        title_chars.sort(key=lambda x: (x.get('top', 0), x.get('x0', 0)))
-                        title_text = ''.join([char.get('text', '') for char in title_chars])
-                        title = re.sub(r'\s+', ' ', title_text).strip()
-                        
-                        # Clean and validate title
-                        if 3 <= len(title) <= 200:
-                            return title
+            if doc.page_count == 0:
+                return ""
+
+            spans = []
+            page_dict = doc[0].get_text("dict")
+            for block in page_dict.get("blocks", []):
+                for line in block.get("lines", []):
+                    spans.extend(line.get("spans", []))
+
+            if not spans:
+                return ""
+
+            # Find largest font size text on first page
+            font_sizes = np.fromiter((s['size'] for s in spans if s.get('size')), dtype=np.float32)
+            if font_sizes.size:
+                max_font_size = float(font_sizes.max())
+
+                # Get text with largest font size
+                title_spans = [s for s in spans
+                               if s.get('size', 12) >= max_font_size * 0.9]
+
+                if title_spans:
+                    # Sort by position and extract text
+                    title_spans.sort(key=lambda s: (s['bbox'][1], s['bbox'][0]))
+                    title_text = ''.join([s.get('text', '') for s in title_spans])
+                    title = _WS.sub(' ', title_text).strip()
+
+                    # Clean and validate title
+                    if 3 <= len(title) <= 200:
+                        return title
         except:
             pass
-        
+
         return ""
     
     def is_likely_heading(self, text, font_size, is_bold, avg_font_size):
         """Determine if text is likely a heading"""
         text_clean = text.strip()
-        
+
         if len(text_clean) < 3 or len(text_clean) > 200:
             return False
-        
-        score = 0
-        
-        # Font size analysis
-        if font_size > avg_font_size * 1.3:
-            score += 4
-        elif font_size > avg_font_size * 1.1:
-            score += 2
-        
-        # Bold text
-        if is_bold:
-            score += 2
-        
-        # Text patterns
-        if re.match(r'^\d+[\.\)]\s+', text_clean):  # Numbered headings
-            score += 3
-        elif re.match(r'^[A-Z][a-z]+(\s+[A-Z][a-z]+)*:?\s*$', text_clean):  # Title case
-            score += 2
-        elif text_clean.isupper() and len(text_clean.split()) >= 2:  # ALL CAPS
-            score += 1
-        
-        # Keyword matching
-        if any(keyword in text_clean.lower() for keyword in self.heading_keywords):
-            score += 1
-        
-        # Avoid common non-headings
-        if re.match(r'^\d+$', text_clean) or text_clean.lower() in ['page', 'continued']:
-            score -= 5
-        
-        return score >= 3
+
+        # Regex/string features stay in Python; scoring runs in the kernel
+        text_lower = text_clean.lower()
+        pat_numbered = bool(_NUMBRACK.match(text_clean))
+        pat_titlecase = not pat_numbered and bool(_TITLECASE.match(text_clean))
+        pat_allcaps = (not pat_numbered and not pat_titlecase
+                       and text_clean.isupper() and len(text_clean.split()) >= 2)
+        has_keyword = any(keyword in text_lower for keyword in self.heading_keywords)
+        is_noise = bool(_ONLYDIGITS.match(text_clean)) or text_lower in ('page', 'continued')
+
+        return _heading_score(font_size, avg_font_size, is_bold,
+                              pat_numbered, pat_titlecase, pat_allcaps,
+                              has_keyword, is_noise) >= 3
     
     def classify_heading_level(self, text, font_size, max_font_size, avg_font_size):
         """Classify heading level H1/H2/H3"""
         text_clean = text.strip()
-        
-        # Font size based classification
-        size_ratio = font_size / avg_font_size if avg_font_size > 0 else 1
-        
-        level_score = 0
-        
-        # Primary: Font size
-        if size_ratio >= 1.5:
-            level_score += 3
-        elif size_ratio >= 1.2:
-            level_score += 2
+
+        # Numbering patterns (most selective first)
+        if _NUM3.match(text_clean):
+            num_depth = 3
+        elif _NUM2.match(text_clean):
+            num_depth = 2
+        elif _NUM1.match(text_clean):
+            num_depth = 1
         else:
-            level_score += 1
-        
-        # Numbering patterns
-        if re.match(r'^\d+\.\s+', text_clean):  # "1. "
-            level_score = max(level_score, 3)
-        elif re.match(r'^\d+\.\d+\s+', text_clean):  # "1.1 "
-            level_score = min(level_score, 2)
-        elif re.match(r'^\d+\.\d+\.\d+\s+', text_clean):  # "1.1.1 "
-            level_score = 1
-        
+            num_depth = 0
+
+        level_score = _level_score(font_size, avg_font_size, num_depth)
+
         # Map to heading levels
         if level_score >= 3:
             return "H1"
@@ -131,9 +203,100 @@ class PDFOutlineExtractor:
     
     def extract_outline(self, pdf_path):
         """Extract structured outline from PDF"""
+        try:
+            with fitz.open(pdf_path) as doc:
+                return self._outline_from_doc(doc, pdf_path)
+        except Exception:
+            return []
+
+    def _outline_from_doc(self, doc, pdf_path):
+        """Outline extraction against an already-open document"""
+        try:
+            return list(self._iter_outline(doc, pdf_path))
+        except Exception:
+            return []
+
+    def _iter_outline(self, doc, pdf_path):
+        """Yield headings in document order as they are classified"""
+        line_summaries = []
+        total_blocks = 0
+
+        # Single streaming pass: accumulate font statistics while
+        # buffering one lightweight summary per line
+        sz_sum = 0.0
+        sz_count = 0
+        sz_max = 0.0
+
+        for page_num, page in enumerate(doc, 1):
+            page_dict = page.get_text("dict")
+            for block in page_dict.get("blocks", []):
+                # Only count text blocks (type 0) - a scanned PDF still
+                # reports its images as type-1 blocks
+                if block.get("type") != 0:
+                    continue
+                total_blocks += 1
+                for line in block.get("lines", []):
+                    spans = line.get("spans", [])
+                    if not spans:
+                        continue
+
+                    text = ''.join([span.get('text', '') for span in spans]).strip()
+                    if not text:
+                        continue
+
+                    line_max = 0.0
+                    is_bold = False
+                    for span in spans:
+                        size = span.get('size')
+                        if size:
+                            sz_sum += size
+                            sz_count += 1
+                            if size > sz_max:
+                                sz_max = size
+                            if size > line_max:
+                                line_max = size
+                        # Flag bit 4 (16) marks bold text
+                        if span.get('flags', 0) & 16:
+                            is_bold = True
+
+                    line_summaries.append((page_num, text, line_max or 12, is_bold))
+
+        if total_blocks == 0:
+            # Likely a scanned PDF - fall back to pdfplumber
+            yield from self._extract_outline_pdfplumber(pdf_path)
+            return
+
+        if not line_summaries:
+            return
+
+        avg_font_size = sz_sum / sz_count if sz_count else 12
+        max_font_size = sz_max if sz_max else 12
+
+        # Detect headings over the buffered line summaries,
+        # deduplicating as they are yielded; summaries are already in
+        # page/reading order so no final sort is needed
+        seen = set()
+        for page_num, text, font_size, is_bold in line_summaries:
+            if self.is_likely_heading(text, font_size, is_bold, avg_font_size):
+                key = (text.lower(), page_num)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                level = self.classify_heading_level(text, font_size, max_font_size, avg_font_size)
+
+                yield {
+                    'level': level,
+                    'text': text,
+                    'page': page_num
+                }
+
+    def _extract_outline_pdfplumber(self, pdf_path):
+        """Fallback outline extraction via pdfplumber char analysis"""
         try:
             with pdfplumber.open(pdf_path) as pdf:
                 headings = []
+                seen = set()
                 all_chars = []
                 
                 # Collect all characters for font analysis
@@ -146,116 +309,221 @@ class PDFOutlineExtractor:
                 if not all_chars:
                     return []
                 
-                # Calculate font statistics
-                font_sizes = [char.get('size', 12) for char in all_chars if char.get('size')]
-                avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
-                max_font_size = max(font_sizes) if font_sizes else 12
+                # Calculate font statistics (C-level reductions)
+                font_sizes = np.fromiter((char['size'] for char in all_chars if char.get('size')), dtype=np.float32)
+                avg_font_size = float(font_sizes.mean()) if font_sizes.size else 12
+                max_font_size = float(font_sizes.max()) if font_sizes.size else 12
                 
                 # Group characters into text blocks
                 for page_num, page in enumerate(pdf.pages, 1):
                     try:
-                        # Get text objects with formatting
-                        text_objects = []
-                        
                         # Use char-level analysis for better formatting detection
                         chars = page.chars
                         if not chars:
                             continue
-                        
-                        # Group chars into lines
-                        lines = {}
-                        for char in chars:
-                            y = round(char.get('top', 0), 1)
-                            if y not in lines:
-                                lines[y] = []
-                            lines[y].append(char)
-                        
+
+                        # Pull each field out of the char dicts exactly once:
+                        # (rounded top, x0, size, text, fontname) records
+                        recs = [(round(c.get('top', 0.0), 1), c.get('x0', 0.0),
+                                 c.get('size', 12.0), c.get('text', ''),
+                                 c.get('fontname', '')) for c in chars]
+
+                        # Boldness per distinct font name, computed once per
+                        # page instead of lowercasing every char's font
+                        bold_map = {name: bool(name) and ('bold' in name.lower() or 'Bd' in name)
+                                    for name in {r[4] for r in recs}}
+
+                        # Group into lines: one sort by (top, x0),
+                        # then a linear groupby pass
+                        recs.sort(key=lambda r: (r[0], r[1]))
+
                         # Process each line
-                        for y, line_chars in lines.items():
-                            line_chars.sort(key=lambda x: x.get('x0', 0))
-                            
-                            text = ''.join([char.get('text', '') for char in line_chars]).strip()
+                        for y, grp in groupby(recs, key=lambda r: r[0]):
+                            line_recs = list(grp)
+
+                            text = ''.join([r[3] for r in line_recs]).strip()
                             if not text:
                                 continue
-                            
+
                             # Get line properties
-                            font_sizes_line = [char.get('size', 12) for char in line_chars if char.get('size')]
-                            font_size = max(font_sizes_line) if font_sizes_line else 12
-                            
-                            # Check if bold (simplified)
-                            font_names = [char.get('fontname', '') for char in line_chars]
-                            is_bold = any('bold' in name.lower() for name in font_names if name)
+                            font_size = max(r[2] for r in line_recs)
+                            is_bold = any(bold_map[r[4]] for r in line_recs)
                             
                             # Check if it's a heading
                             if self.is_likely_heading(text, font_size, is_bold, avg_font_size):
+                                key = (text.lower(), page_num)
+                                if key in seen:
+                                    continue
+                                seen.add(key)
+
                                 level = self.classify_heading_level(text, font_size, max_font_size, avg_font_size)
-                                
+
                                 headings.append({
                                     'level': level,
                                     'text': text,
                                     'page': page_num
                                 })
-                    
+
                     except Exception as e:
                         continue
-                
-                # Remove duplicates and sort
-                seen = set()
-                unique_headings = []
-                for h in headings:
-                    key = (h['text'].lower().strip(), h['page'])
-                    if key not in seen:
-                        seen.add(key)
-                        unique_headings.append(h)
-                
+
                 # Sort by page then by likely document order
-                unique_headings.sort(key=lambda x: (x['page'], x['text']))
-                
-                return unique_headings
+                headings.sort(key=lambda x: (x['page'], x['text']))
+
+                return headings
         
         except Exception as e:
             return []
     
     def process_pdf(self, pdf_path):
         """Process single PDF and return structured outline"""
-        title = self.extract_title(pdf_path)
-        outline = self.extract_outline(pdf_path)
-        
+        # One open shared by title and outline extraction
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception:
+            return {"title": "", "outline": []}
+
+        try:
+            title = self._title_from_doc(doc)
+            outline = self._outline_from_doc(doc, pdf_path)
+        finally:
+            doc.close()
+
         return {
             "title": title,
             "outline": outline
         }
 
+    def process_pdf_to(self, pdf_path, output_file):
+        """Process a PDF, streaming headings straight to a JSON file
+
+        Headings are written as they are classified instead of being
+        accumulated, so peak memory stays flat on huge outlines. The file
+        is built under a temp name and renamed into place atomically.
+        """
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception:
+            _dump_json({"title": "", "outline": []}, output_file)
+            return
+
+        output_file = Path(output_file)
+        tmp_file = output_file.with_name(output_file.name + '.tmp')
+        try:
+            title = self._title_from_doc(doc)
+            _stream_result(tmp_file, title, self._iter_outline(doc, pdf_path))
+            os.replace(tmp_file, output_file)
+        except Exception:
+            tmp_file.unlink(missing_ok=True)
+            raise
+        finally:
+            doc.close()
+
+INPUT_DIR = "/app/input"
+OUTPUT_DIR = "/app/output"
+
+# One extractor per worker process, built lazily so nothing heavy is
+# pickled or forked from the parent
+_worker_extractor = None
+
+def _get_extractor():
+    global _worker_extractor
+    if _worker_extractor is None:
+        _worker_extractor = PDFOutlineExtractor()
+    return _worker_extractor
+
+def _dump_json(obj, output_file):
+    """Serialize with orjson when available, stdlib json otherwise"""
+    if orjson is not None:
+        Path(output_file).write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False)
+
+def _stream_result(output_file, title, headings):
+    """Write {"title": ..., "outline": [...]} incrementally as headings arrive"""
+    if orjson is not None:
+        dump = orjson.dumps
+    else:
+        dump = lambda obj: json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    with open(output_file, 'wb') as f:
+        f.write(b'{"title": ' + dump(title) + b', "outline": [')
+        first = True
+        for heading in headings:
+            if not first:
+                f.write(b', ')
+            f.write(dump(heading))
+            first = False
+        f.write(b']}')
+
+def _pdf_fingerprint(pdf_file):
+    """Cheap content fingerprint: file size plus first and last 64KB"""
+    h = hashlib.md5()
+    size = pdf_file.stat().st_size
+    h.update(str(size).encode())
+    with open(pdf_file, 'rb') as f:
+        h.update(f.read(65536))
+        # Always hash the tail once the head no longer covers it - the
+        # xref/trailer that changes on update lives at EOF (the overlap
+        # for files under 128KB is harmless)
+        if size > 65536:
+            f.seek(max(size - 65536, 0))
+            h.update(f.read(65536))
+    return h.hexdigest()
+
+def _process_one(pdf_file):
+    """Process a single PDF (runs inside a worker process)"""
+    pdf_file = Path(pdf_file)
+    try:
+        output_file = Path(OUTPUT_DIR) / f"{pdf_file.stem}.json"
+
+        # Reuse cached result if this exact content was processed before
+        cache_dir = Path(OUTPUT_DIR) / ".cache"
+        cache_dir.mkdir(exist_ok=True)
+        cache_file = cache_dir / f"{_pdf_fingerprint(pdf_file)}.json"
+        if cache_file.exists():
+            shutil.copyfile(cache_file, output_file)
+            print(f"Cached {pdf_file.name} -> {output_file.name}")
+            return
+
+        print(f"Processing {pdf_file.name}...")
+
+        # Stream into the cache, then publish under the PDF's stem
+        _get_extractor().process_pdf_to(pdf_file, cache_file)
+        shutil.copyfile(cache_file, output_file)
+
+        print(f"Completed {pdf_file.name} -> {output_file.name}")
+
+    except Exception as e:
+        print(f"Error processing {pdf_file.name}: {e}")
+        # Create fallback output
+        fallback = {"title": "", "outline": []}
+        output_file = Path(OUTPUT_DIR) / f"{pdf_file.stem}.json"
+        _dump_json(fallback, output_file)
+
 def main():
     """Main processing function"""
-    input_dir = "/app/input"
-    output_dir = "/app/output"
-    
     # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
-    
-    extractor = PDFOutlineExtractor()
-    
-    # Process all PDFs in input directory
-    for pdf_file in Path(input_dir).glob("*.pdf"):
-        try:
-            print(f"Processing {pdf_file.name}...")
-            result = extractor.process_pdf(pdf_file)
-            
-            # Save output
-            output_file = Path(output_dir) / f"{pdf_file.stem}.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
-            
-            print(f"Completed {pdf_file.name} -> {output_file.name}")
-            
-        except Exception as e:
-            print(f"Error processing {pdf_file.name}: {e}")
-            # Create fallback output
-            fallback = {"title": "", "outline": []}
-            output_file = Path(output_dir) / f"{pdf_file.stem}.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(fallback, f, indent=2)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # Nothing to do without an input mount - mirror the old glob-based
+    # behavior of exiting quietly
+    if not os.path.isdir(INPUT_DIR):
+        return
+
+    # Scan with os.scandir and skip PDFs whose output already exists
+    done = {entry.name[:-5] for entry in os.scandir(OUTPUT_DIR)
+            if entry.name.endswith('.json')}
+    with os.scandir(INPUT_DIR) as it:
+        pdf_files = [entry.path for entry in it
+                     if entry.name.endswith('.pdf') and entry.name[:-4] not in done]
+    if not pdf_files:
+        return
+
+    # PDFs are independent - fan out across cores
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(pdf_files))) as executor:
+        list(executor.map(_process_one, pdf_files))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file